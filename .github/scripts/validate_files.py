@@ -1,7 +1,12 @@
 import os
 import sys
 import json
+import time
+import asyncio
+import argparse
 import httpx
+from urllib.parse import quote
+from xml.etree import ElementTree
 
 
 # External service URL
@@ -11,48 +16,165 @@ changed_files = []
 if CHANGED_FILES and CHANGED_FILES != "":
     changed_files: list = CHANGED_FILES.split()
 
+# status codes worth retrying, the validator or the proxied app is busy or restarting
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+
 print(f"CHANGED_FILES: {CHANGED_FILES}")
 
 def get_pushed_files():
     return [file for file in changed_files if file.endswith(".json")]
 
 
-def validate_file(file_path):
-    """Validate a single file against the external service."""
-    print(f"Validating {file_path}...")
-    filename = os.path.basename(file_path)
-    url = VALIDATION_URL + "products/" + filename
-    print(f"Validation URL: {url}")
-    response = httpx.get(url)
-    print(f"Response: {response.status_code} {response.text}")
-    if 200 <= response.status_code < 303:
-        print(f"✅ {file_path} is valid.")
-        return True
+def get_directory_files(directory):
+    """Return all JSON files in a directory."""
+    return sorted(
+        os.path.join(directory, file_name) for file_name in os.listdir(directory) if file_name.endswith(".json")
+    )
+
+
+def get_ids(ids, ids_file):
+    """Return the product ids given on the command line and in the ids file (one id per line)."""
+    all_ids = list(ids or [])
+    if ids_file:
+        with open(ids_file, "r") as file:
+            all_ids.extend(line.strip() for line in file if line.strip())
+    return all_ids
+
+
+async def validate_product(client, semaphore, name, product_id, retries):
+    """
+    Validate a single product against the external service, retrying transient errors.
+
+    return (dict): The result with the status, latency and failure reason of the validation
+    """
+    url = "products/" + quote(product_id, safe="")
+    result = {"name": name, "url": url, "valid": False, "status": None, "attempts": 0, "latency_ms": None,
+              "reason": None}
+    async with semaphore:
+        for attempt in range(1, retries + 2):
+            result["attempts"] = attempt
+            start = time.perf_counter()
+            try:
+                response = await client.get(url)
+            except httpx.TransportError as ex:
+                result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+                result["reason"] = f"{type(ex).__name__}: {ex}"
+            else:
+                result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+                result["status"] = response.status_code
+                if 200 <= response.status_code < 303:
+                    result["valid"] = True
+                    result["reason"] = None
+                    break
+                result["reason"] = response.text[:2000]
+                if response.status_code not in RETRY_STATUS_CODES:
+                    break
+            if attempt <= retries:
+                await asyncio.sleep(0.5 * 2 ** (attempt - 1))
+
+    mark = "✅" if result["valid"] else "❌"
+    print(f"{mark} {name} {result['status']} {result['latency_ms']}ms")
+    return result
+
+
+async def validate_products(products, validation_url, concurrency, retries, timeout):
+    """
+    Validate products concurrently over one pooled client.
+
+    products (list): (name, product id) pairs
+    """
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(base_url=validation_url, limits=limits, timeout=timeout) as client:
+        return await asyncio.gather(
+            *[validate_product(client, semaphore, name, product_id, retries) for name, product_id in products]
+        )
+
+
+def write_report(results, report_path, report_format, duration):
+    """Write the results as a JSON or JUnit report."""
+    failures = [result for result in results if not result["valid"]]
+    if report_format == "junit":
+        suite = ElementTree.Element(
+            "testsuite", name="validate_files", tests=str(len(results)), failures=str(len(failures)),
+            time=f"{duration:.3f}"
+        )
+        for result in results:
+            case = ElementTree.SubElement(
+                suite, "testcase", classname="products", name=result["name"],
+                time=f"{(result['latency_ms'] or 0) / 1000:.3f}"
+            )
+            if not result["valid"]:
+                failure = ElementTree.SubElement(case, "failure", message=f"status {result['status']}")
+                failure.text = result["reason"]
+        ElementTree.ElementTree(suite).write(report_path, encoding="utf-8", xml_declaration=True)
     else:
-        print(f"❌ {file_path} is invalid.")
-        return False
+        report = {
+            "total": len(results),
+            "valid": len(results) - len(failures),
+            "invalid": len(failures),
+            "duration_s": round(duration, 3),
+            "results": results,
+        }
+        with open(report_path, "w") as file:
+            json.dump(report, file, indent=2)
+    print(f"Report written to {report_path}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Validate products against the SKG-IF validation proxy.")
+    parser.add_argument("--dir", help="Validate all JSON files in this directory")
+    parser.add_argument("--ids", nargs="*", help="Validate these product ids")
+    parser.add_argument("--ids-file", help="Validate the product ids in this file, one per line")
+    parser.add_argument("--url", default=VALIDATION_URL, help="The validation service URL")
+    parser.add_argument("--concurrency", type=int, default=16, help="Maximum concurrent requests")
+    parser.add_argument("--retries", type=int, default=3, help="Retries for transient errors")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Request timeout in seconds")
+    parser.add_argument("--report", help="Write a report to this file")
+    parser.add_argument("--report-format", choices=["json", "junit"], default="json")
+    return parser.parse_args(argv)
 
 
 def main():
     """Main function to validate pushed files."""
-    print(f"CHANGED_FILES: {CHANGED_FILES}")
-    pushed_files = get_pushed_files()
-    print(f"Pushed files: {pushed_files}")
-    if not pushed_files:
+    args = parse_args()
+    missing = []
+    if args.dir:
+        files = get_directory_files(args.dir)
+    elif args.ids or args.ids_file:
+        files = None
+        products = [(product_id, product_id) for product_id in get_ids(args.ids, args.ids_file)]
+    else:
+        print(f"CHANGED_FILES: {CHANGED_FILES}")
+        files = get_pushed_files()
+        print(f"Pushed files: {files}")
+
+    if files is not None:
+        missing = [file_path for file_path in files if not os.path.exists(file_path)]
+        for file_path in missing:
+            print(f"⚠️ File {file_path} does not exist locally.")
+        products = [(file_path, os.path.basename(file_path)) for file_path in files if file_path not in missing]
+
+    if not products and not missing:
         print("No JSON files to validate.")
         return
 
-    all_valid = True
-    for file_path in pushed_files:
-        if os.path.exists(file_path):
-            if not validate_file(file_path):
-                all_valid = False
-        else:
-            print(f"⚠️ File {file_path} does not exist locally.")
-            all_valid = False
+    start = time.perf_counter()
+    results = asyncio.run(validate_products(products, args.url, args.concurrency, args.retries, args.timeout))
+    duration = time.perf_counter() - start
+    results.extend(
+        {"name": file_path, "url": None, "valid": False, "status": None, "attempts": 0, "latency_ms": None,
+         "reason": "File does not exist locally"}
+        for file_path in missing
+    )
+
+    invalid = sum(1 for result in results if not result["valid"])
+    print(f"Validated {len(results)} products in {duration:.2f}s: {len(results) - invalid} valid, {invalid} invalid")
+    if args.report:
+        write_report(results, args.report, args.report_format, duration)
 
-    if not all_valid:
-        exit(1)
+    if invalid:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
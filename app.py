@@ -1,18 +1,29 @@
 from fastapi import FastAPI, Query, Header, HTTPException
-from fastapi.responses import HTMLResponse, Response, JSONResponse
+from fastapi.responses import HTMLResponse, Response, JSONResponse, StreamingResponse
 from urllib.parse import urlparse, unquote, parse_qs
-from dicttoxml import dicttoxml
 import random
-import requests
 import os
 import json
 import dotenv
 import logging
 import re
 import concurrent.futures
-from typing import List, Dict
-from markdown_plain_text.extention import convert_to_plain_text
-from tqdm import tqdm
+import itertools
+import collections
+import queue
+import hashlib
+import gzip
+import zlib
+import threading
+import time
+import functools
+import dataclasses
+from typing import List, Dict, Iterable, Iterator, TYPE_CHECKING
+
+# requests, tqdm, markdown_plain_text and argparse are imported where they are used, so that processes which only
+# serve products do not pay for them at startup
+if TYPE_CHECKING:
+    import requests
 
 logger = logging.getLogger(__name__)
 logger.level = logging.DEBUG
@@ -21,20 +32,90 @@ output_path_data = "./data"
 output_path_queries = "./queries"
 delete_path = "./deleted_documents"
 parsed_datasets_directory = './data/parsed_datasets'
+rich_user_contents_directory = './data/rich_user_contents'
+vocabs_directory = '/src/properties'
+# fingerprints of the inputs of every processed record, to skip records whose inputs did not change
+transform_manifest_path = './data/transform_manifest.json'
+# completion manifests of sharded transforms and the combined product index built from them
+shards_directory = './data/shards'
+product_index_path = './data/product_index.json'
 template_path = "./template_ostrails.json"
 processed_tools_folder = 'processed_jsonfiles_tools'
-processed_datasets_folder = 'processed_jsonfiles_datasets'
 basex_host = "basex-test"
+# deadlines of backend calls in seconds; creating a basex database from all datasets takes longer
+solr_timeout: float = 60.0
+basex_timeout: float = 30.0
+basex_create_timeout: float = 3600.0
+
+
+@dataclasses.dataclass(frozen=True)
+class Settings:
+    """
+    Configuration read from .env and the environment.
+    """
+    solr_url: str | None = None
+    username: str | None = None
+    password: str | None = None
+    # extra Solr fields (comma separated) needed by .rq queries on top of the template md: paths, "*" fetches all
+    solr_extra_fields: str | None = None
+    # folder the SKG-IF products (and their compressed copies) are written to and served from by /products
+    products_directory: str = "processed_jsonfiles_datasets"
+
+
+@functools.lru_cache(maxsize=None)
+def get_settings(env_path: str = ".env") -> Settings:
+    """
+    Read the .env file once. Its values are also added to the environment, without overriding variables which are
+    already set.
+
+    env_path (str): The path of the .env file
+    return (Settings): The configuration
+    """
+    values = dotenv.dotenv_values(env_path)
+    for key, value in values.items():
+        if value is not None:
+            os.environ.setdefault(key, value)
+    return Settings(
+        solr_url=values.get("SOLR_URL"),
+        username=values.get("USERNAME"),
+        password=values.get("PASSWORD"),
+        solr_extra_fields=values.get("SOLR_EXTRA_FIELDS"),
+        products_directory=os.getenv("PRODUCTS_DIRECTORY", Settings.products_directory),
+    )
+
 
 # Solr API
-dotenv.load_dotenv()
-solr_url = dotenv.get_key(".env", "SOLR_URL")
-username = dotenv.get_key(".env", "USERNAME")
-password = dotenv.get_key(".env", "PASSWORD")
+settings = get_settings()
+solr_url = settings.solr_url
+username = settings.username
+password = settings.password
+solr_extra_fields = settings.solr_extra_fields
+# Solr fields which are always fetched: the id and the fields normalized in store_solr_response
+solr_base_fields = ["id", "name", "description"]
+products_directory = settings.products_directory
+processed_datasets_folder = products_directory
+# templates applied by /transform and the pipeline: (template path, template type, output folder)
+# the first profile is the SKG-IF product, which is validated against the schema
+output_profiles = [(template_path, "datasets", processed_datasets_folder)]
 # global cache for vocabularies
 vocabs = {}
 # all processed files
 processed_files = {}
+# global cache for loaded templates {path: (modification time, template)}
+templates = {}
+# global cache for file fingerprints {path: (modification time, size, sha256)}
+fingerprints = {}
+# directories created by the output writers
+created_directories = set()
+# SKG-IF OpenAPI spec used for the embedded product validation
+skg_if_spec_path = "./skg-if-api.yaml"
+validation_summary_path = "./data/validation_summary.json"
+# number of products validated at once during the transform
+validation_batch_size: int = 100
+# compiled product validator, False if schema validation is not available
+product_validator = None
+# validation results of the current transform run
+validation_summary = {}
 
 # title should be 67 characters with 3 dots, and description should be 297 characters with 3 dots
 # title_limit: int = 67 # limit for 8 media ineo
@@ -44,6 +125,22 @@ description_limit: int = 65535
 more_characters: str = "..."
 # ID length limit
 id_limit: int = 128
+# XML and text responses larger than this are streamed in chunks of this size
+response_chunk_size: int = 64 * 1024
+# valid XML element names, other dictionary keys are rendered as <key name="...">
+xml_name_pattern = re.compile(r"^[^\W\d][\w.\-]*$")
+
+# brotli is optional, products are only precompressed and served with gzip without it
+try:
+    import brotli
+except ImportError:
+    brotli = None
+    logger.info("brotli not installed! Using gzip only")
+
+# precompressed copies written next to every product: {encoding: file extension}
+compressed_sidecars = {"gzip": ".gz", "br": ".br"} if brotli is not None else {"gzip": ".gz"}
+# responses smaller than this are not compressed on the fly
+compression_minimum_size: int = 500
 
 # base query
 try:
@@ -68,6 +165,8 @@ def shorten_text(text: str, limit: int, more_characters: str = "...") -> str:
     """
     Shorten the text to a given limit and add more characters if the text is longer than the limit.
     """
+    from markdown_plain_text.extention import convert_to_plain_text
+
     text = convert_to_plain_text(text)
     if text.startswith("{}"):
         text = "{code:und}" + text[2:]
@@ -93,9 +192,474 @@ def remove_html_tags(text):
     return re.sub(clean, '', text)
 
 
-def _fetch_solr_records(query: str, solr_url: str, username, password, start=0, rows=10000) -> Dict:
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limiter for a backend (Solr, basex).
+
+    The limit grows by about one slot per round of successful calls while the latency stays flat, and is multiplied
+    by backoff on errors, 429 and 5xx responses and latency spikes: when the recent (fast moving average) latency is
+    above latency_tolerance times the baseline (slow moving average) latency.
+    """
+
+    def __init__(self, name: str, initial_limit: int = 4, min_limit: int = 1, max_limit: int = 32,
+                 latency_tolerance: float = 2.0, backoff: float = 0.5):
+        self.name = name
+        self.limit: float = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.in_flight = 0
+        self.baseline_latency: float | None = None
+        self.recent_latency: float | None = None
+        self.calls = 0
+        self.errors = 0
+        self.backoffs = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency: float, overloaded: bool = False):
+        """
+        Free a slot and adapt the limit to the outcome of the call.
+
+        latency (float): The duration of the call in seconds
+        overloaded (bool): Whether the backend failed or signalled overload
+        """
+        with self._condition:
+            self.in_flight -= 1
+            self.calls += 1
+            if self.baseline_latency is None:
+                self.baseline_latency = self.recent_latency = latency
+            self.recent_latency += (latency - self.recent_latency) * 0.2
+            self.baseline_latency += (latency - self.baseline_latency) * 0.01
+
+            if overloaded or self.recent_latency > self.latency_tolerance * self.baseline_latency:
+                self.errors += overloaded
+                self.backoffs += 1
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                # start over from the new latency level, do not keep backing off on the same spike
+                self.baseline_latency = self.recent_latency = max(latency, self.baseline_latency)
+            elif self.in_flight + 1 >= self.limit / 2:
+                # only grow when the current limit is actually used
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+    def call(self, function, *args, **kwargs):
+        """
+        Call function within the limit; exceptions and responses with status 429 or 5xx count as overload.
+        """
+        self.acquire()
+        start = time.perf_counter()
+        overloaded = True
+        try:
+            result = function(*args, **kwargs)
+            status_code = getattr(result, "status_code", 200)
+            overloaded = status_code == 429 or status_code >= 500
+            return result
+        finally:
+            self.release(time.perf_counter() - start, overloaded)
+
+    def metrics(self) -> Dict:
+        with self._condition:
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "baseline_latency_ms": round(self.baseline_latency * 1000, 2) if self.baseline_latency else None,
+                "recent_latency_ms": round(self.recent_latency * 1000, 2) if self.recent_latency else None,
+                "calls": self.calls,
+                "errors": self.errors,
+                "backoffs": self.backoffs,
+            }
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling a backend while its circuit is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Fail fast while a backend is unhealthy.
+
+    After failure_threshold consecutive failures (exceptions or 5xx responses) the circuit opens and calls raise
+    CircuitOpenError without reaching the backend. After reset_timeout seconds one trial call is let through:
+    the circuit closes again if it succeeds and stays open for another reset_timeout if it fails.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _before_call(self) -> bool:
+        """
+        Let a call through or raise CircuitOpenError.
+
+        return (bool): Whether the call is the trial call of a half-open circuit
+        """
+        with self._lock:
+            if self.state == "closed":
+                return False
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half-open"
+                return True
+            self.rejected += 1
+            raise CircuitOpenError(f"Circuit of {self.name} is {self.state} after {self.failures} failures")
+
+    def _after_call(self, failed: bool, trial: bool):
+        """
+        Record the outcome of a call. Only the trial call decides on a half-open circuit: calls which were already
+        running when the circuit opened do not close or reopen it when they finish.
+        """
+        with self._lock:
+            if trial:
+                if failed:
+                    self.state = "open"
+                    self.opened_at = time.monotonic()
+                else:
+                    logger.info(f"Closing the circuit of {self.name}")
+                    self.state = "closed"
+                    self.failures = 0
+            elif self.state == "closed":
+                if not failed:
+                    self.failures = 0
+                    return
+                self.failures += 1
+                if self.failures >= self.failure_threshold:
+                    logger.error(f"Opening the circuit of {self.name} after {self.failures} failures")
+                    self.state = "open"
+                    self.opened_at = time.monotonic()
+
+    def call(self, function, *args, **kwargs):
+        trial = self._before_call()
+        failed = True
+        try:
+            result = function(*args, **kwargs)
+            failed = getattr(result, "status_code", 200) >= 500
+            return result
+        finally:
+            self._after_call(failed, trial)
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "rejected": self.rejected}
+
+
+class Hedger:
+    """
+    Hedged requests for idempotent calls: when a call takes longer than the given percentile of the recent
+    latencies, a duplicate call is started and the first successful result is used.
+    Nothing is hedged until min_samples latencies have been observed.
+    """
+
+    def __init__(self, name: str, percentile: float = 0.95, min_delay: float = 0.01, window: int = 500,
+                 min_samples: int = 50, max_workers: int = 64):
+        self.name = name
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.max_workers = max_workers
+        self.fired = 0
+        self.won = 0
+        self._latencies = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def delay(self) -> float | None:
+        """
+        Return the hedging delay in seconds, None while there are too few samples.
+        """
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            latencies = sorted(self._latencies)
+        return max(self.min_delay, latencies[min(len(latencies) - 1, int(self.percentile * len(latencies)))])
+
+    def _timed(self, function, args, kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        with self._lock:
+            self._latencies.append(time.perf_counter() - start)
+        return result
+
+    def call(self, function, *args, **kwargs):
+        delay = self.delay()
+        if delay is None:
+            return self._timed(function, args, kwargs)
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers,
+                                                                       thread_name_prefix=f"hedge-{self.name}")
+        primary = self._executor.submit(self._timed, function, args, kwargs)
+        done, _ = concurrent.futures.wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        hedge = self._executor.submit(self._timed, function, args, kwargs)
+        with self._lock:
+            self.fired += 1
+        error = None
+        for future in concurrent.futures.as_completed([primary, hedge]):
+            try:
+                result = future.result()
+            except Exception as ex:
+                error = error or ex
+                continue
+            if future is hedge:
+                with self._lock:
+                    self.won += 1
+            return result
+        raise error
+
+    def metrics(self) -> Dict:
+        delay = self.delay()
+        with self._lock:
+            return {"fired": self.fired, "won": self.won,
+                    "delay_ms": round(delay * 1000, 2) if delay is not None else None}
+
+
+# adaptive concurrency limits per backend
+solr_limiter = AdaptiveLimiter("solr", initial_limit=4, max_limit=16)
+basex_limiter = AdaptiveLimiter("basex", initial_limit=8, max_limit=64)
+# fail fast while a backend is down
+solr_breaker = CircuitBreaker("solr")
+basex_breaker = CircuitBreaker("basex")
+# hedged md lookups on basex
+basex_hedger = Hedger("basex")
+
+
+def ensure_directory(directory: str):
+    """
+    Create a directory once; directories known to exist are not checked again. publish_file creates them again
+    if they were removed since.
+    """
+    if directory not in created_directories:
+        os.makedirs(directory or ".", exist_ok=True)
+        created_directories.add(directory)
+
+
+def publish_file(filename: str, content: bytes, fsync: bool = False):
+    """
+    Write a file atomically: readers see either the previous or the complete new file, never a partial one.
+    The content is written to a temporary file in the same folder, which is then renamed to filename.
+    """
+    directory = os.path.dirname(filename)
+    ensure_directory(directory)
+    temp_filename = os.path.join(
+        directory, f".{os.path.basename(filename)}.{os.getpid()}.{threading.get_ident()}.tmp"
+    )
+    try:
+        file = open(temp_filename, "wb")
+    except FileNotFoundError:
+        # the directory was removed after it was created, e.g. by a cleanup between two runs of the service
+        created_directories.discard(directory)
+        ensure_directory(directory)
+        file = open(temp_filename, "wb")
+    with file:
+        file.write(content)
+        if fsync:
+            file.flush()
+            os.fsync(file.fileno())
+    os.replace(temp_filename, filename)
+
+
+def fsync_directory(directory: str):
+    """
+    Make the renames in a directory durable.
+    """
+    fd = os.open(directory or ".", os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def encode_output(filename: str, data, sidecars: bool = False) -> List[tuple[str, bytes]]:
+    """
+    Serialize data as indented JSON, with its precompressed sidecars ({filename}.gz, {filename}.br) if asked.
+    The JSON file comes first, so that sidecars are never older than the file they belong to.
+    """
+    content = json.dumps(data, indent=2).encode("utf-8")
+    files = [(filename, content)]
+    if sidecars:
+        files.extend((filename + extension, compress(content, encoding, sidecar=True))
+                     for encoding, extension in compressed_sidecars.items())
+    return files
+
+
+class OutputWriter:
+    """
+    Write-behind writer for the JSON outputs of the harvest and the transform.
+
+    write_json only queues the data. A background thread serializes (and compresses) it and publishes the files
+    atomically in batches of batch_size, or whatever arrived within flush_interval seconds. Each file is synced
+    before its rename and each directory once per batch. close waits until everything is written and raises the
+    first write error.
+    """
+
+    _close = object()
+
+    def __init__(self, batch_size: int = 100, flush_interval: float = 0.5, fsync: bool = True,
+                 max_pending: int = 10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.written = 0
+        self._error: Exception | None = None
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name="output-writer", daemon=True)
+        self._thread.start()
+
+    def write_json(self, filename: str, data, sidecars: bool = False):
+        """
+        Queue data to be written to filename as JSON, with precompressed sidecars if sidecars is set.
+        """
+        if self._error is not None:
+            raise self._error
+        self._queue.put((filename, data, sidecars))
+
+    def _run(self):
+        closing = False
+        while not closing:
+            batch = []
+            item = self._queue.get()
+            try:
+                while True:
+                    if item is self._close:
+                        closing = True
+                        break
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                    item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                pass
+            if batch:
+                self._write_batch(batch)
+
+    def _write_batch(self, batch: List[tuple]):
+        directories = set()
+        try:
+            for filename, data, sidecars in batch:
+                for path, content in encode_output(filename, data, sidecars):
+                    publish_file(path, content, self.fsync)
+                directories.add(os.path.dirname(filename))
+                self.written += 1
+            if self.fsync:
+                for directory in directories:
+                    fsync_directory(directory)
+        except Exception as ex:
+            logger.error(f"Error writing outputs: {ex}")
+            if self._error is None:
+                self._error = ex
+
+    def close(self):
+        """
+        Write all queued outputs and stop the background thread.
+        """
+        if self._thread.is_alive():
+            self._queue.put(self._close)
+            self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        elif self._thread.is_alive():
+            self._queue.put(self._close)
+            self._thread.join()
+
+
+def iter_md_paths(template) -> Iterator[tuple[str, str | None]]:
+    """
+    Yield the path (without "[]") and the vocab filter of every md: instruction in a template,
+    e.g. ("@queries/domains.rq", "researchDomains") for "<md:@queries/domains.rq:researchDomains,null".
+    """
+    if isinstance(template, dict):
+        for value in template.values():
+            yield from iter_md_paths(value)
+    elif isinstance(template, list):
+        for item in template:
+            yield from iter_md_paths(item)
+    elif isinstance(template, str) and template.startswith("<"):
+        for info_value in template.split("<")[1].split(","):
+            info_parts = info_value.split(":")
+            if not info_value.startswith("md") or len(info_parts) < 2:
+                continue
+            path = info_parts[1]
+            if path.endswith("[]"):
+                path = path[:-2]
+            yield path, info_parts[2].strip() if len(info_parts) > 2 else None
+
+
+def template_solr_fields(template_path: str, extra_fields: str | None = None) -> List[str] | None:
+    """
+    Collect the Solr fields the template reads through its md: instructions, to be sent as the fl parameter.
+
+    template_path (str): The template file, e.g. template_ostrails.json
+    extra_fields (str): Comma separated fields needed on top of the md: paths, e.g. by .rq queries.
+                        "*" disables the projection.
+
+    Templates with .rq queries fetch all fields unless extra_fields lists the fields the queries need, as the
+    queries read basex, which is loaded from the harvested records.
+
+    return (list | None): The fields to fetch, or None when all fields should be fetched
+    """
+    if extra_fields is not None and extra_fields.strip() == "*":
+        return None
+
+    fields = {field: None for field in solr_base_fields}
+    has_queries = False
+    for path, _ in iter_md_paths(load_template(template_path)):
+        if path.startswith("@"):
+            has_queries = True
+        else:
+            fields[path] = None
+
+    for field in (extra_fields or "").split(","):
+        if field.strip():
+            fields[field.strip()] = None
+
+    if has_queries and not (extra_fields or "").strip():
+        logger.info(f"{template_path} uses .rq queries and SOLR_EXTRA_FIELDS is not set; fetching all fields")
+        return None
+    return list(fields)
+
+
+def profiles_solr_fields(profiles: List[tuple[str, str, str]]) -> List[str] | None:
+    """
+    Collect the Solr fields needed by the templates of all profiles, None if all fields are needed.
+    """
+    fields = {}
+    for profile_template_path, _, _ in profiles:
+        profile_fields = template_solr_fields(profile_template_path, solr_extra_fields)
+        if profile_fields is None:
+            return None
+        fields.update(dict.fromkeys(profile_fields))
+    return list(fields)
+
+
+def _fetch_solr_records(query: str, solr_url: str, username, password, start=0, rows=10000,
+                        fields: List[str] | None = None) -> Dict:
     """
     Retrieve Solr records in parallel with a given query.
+    Only the given fields are returned when fields is set.
     """
     params = {
         "q": query,
@@ -103,13 +667,19 @@ def _fetch_solr_records(query: str, solr_url: str, username, password, start=0,
         "start": start,
         "rows": rows,
     }
-    response = requests.get(f"{solr_url}/select", params=params, auth=(username, password))
+    if fields:
+        params["fl"] = ",".join(fields)
+    import requests
+
+    response = solr_breaker.call(solr_limiter.call, requests.get, f"{solr_url}/select", params=params,
+                                 auth=(username, password), timeout=solr_timeout)
     response.raise_for_status()  # Raise exception if the request failed
     data = response.json()
     return data["response"]
 
 
-def fetch_solr_records(query: str, solr_url: str, username: str, password: str, start=0, rows=10000) -> List[Dict]:
+def fetch_solr_records(query: str, solr_url: str, username: str, password: str, start=0, rows=10000,
+                       fields: List[str] | None = None) -> List[Dict]:
     """
     Retrieve Solr records in parallel with a given query.
     """
@@ -118,14 +688,15 @@ def fetch_solr_records(query: str, solr_url: str, username: str, password: str,
     total_records = response["numFound"]
     logger.info(f"Total records in Solr: {total_records}")
 
-    # Retrieve the records in parallel
+    # Retrieve the records in parallel, solr_limiter decides how many requests are in flight
     records = []
-    with concurrent.futures.ThreadPoolExecutor() as executor:
+    with concurrent.futures.ThreadPoolExecutor(max_workers=solr_limiter.max_limit) as executor:
         futures = []
         for start in range(0, total_records, rows):
             futures.append(
                 executor.submit(
-                    _fetch_solr_records, query, solr_url, username, password, start=start, rows=rows
+                    _fetch_solr_records, query, solr_url, username, password, start=start, rows=rows,
+                    fields=fields
                 )
             )
         for future in concurrent.futures.as_completed(futures):
@@ -133,7 +704,63 @@ def fetch_solr_records(query: str, solr_url: str, username: str, password: str,
     return records
 
 
-def store_solr_response(base_query: str, solr_url: str, username, password, parsed_datasets_directory: str):
+def iter_solr_pages(query: str, solr_url: str, username: str, password: str, rows=100,
+                    fields: List[str] | None = None, prefetch: int | None = None):
+    """
+    Retrieve Solr records page by page, with at most prefetch pages in flight (solr_limiter.max_limit by default).
+    solr_limiter decides how many of them are requested at the same time.
+
+    yield (list): The docs of a page, in order of arrival
+    """
+    response = _fetch_solr_records(query, solr_url, username, password, start=0, rows=0)
+    total_records = response["numFound"]
+    logger.info(f"Total records in Solr: {total_records}")
+
+    prefetch = prefetch or solr_limiter.max_limit
+    starts = iter(range(0, total_records, rows))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=prefetch) as executor:
+        def submit(start):
+            return executor.submit(
+                _fetch_solr_records, query, solr_url, username, password, start=start, rows=rows, fields=fields
+            )
+
+        pending = {submit(start) for start in itertools.islice(starts, prefetch)}
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                next_start = next(starts, None)
+                if next_start is not None:
+                    pending.add(submit(next_start))
+                yield future.result()["docs"]
+
+
+def normalize_record(doc: Dict) -> tuple[str, Dict]:
+    """
+    Clean up a Solr record: remove HTML tags from the description, shorten the title and description,
+    and shorten the id to id_limit characters.
+
+    return (tuple): The (shortened) id and the normalized record
+    """
+    # remove HTML tags from the description field
+    temp_list = []
+    for elem in doc.get("description", []):
+        temp_list.append(remove_html_tags(elem))
+    doc["description"] = temp_list
+    # shorten title and description
+    doc["name"] = shorten_list_or_string(doc.get("name", ""), title_limit, more_characters)
+    doc["description"] = shorten_list_or_string(doc.get("description", ""), description_limit, more_characters)
+
+    # get the id of the dataset and shorten it to 128 characters if it is longer
+    current_id: str | None = doc.get("id", None)
+    if current_id is None:
+        raise Exception(f"Dataset {doc} does not have 'id'!")
+    if len(current_id) > id_limit:
+        current_id = current_id[:id_limit]
+    return current_id, doc
+
+
+def store_solr_response(base_query: str, solr_url: str, username, password, parsed_datasets_directory: str,
+                        fields: List[str] | None = None):
     """
     Store the list of records from fetch_solr_records into individual JSON files.
     """
@@ -143,43 +770,23 @@ def store_solr_response(base_query: str, solr_url: str, username, password, pars
     Args:
     parsed_datasets_directory (str): Path to the directory to save the parsed datasets.
     dataset_file_path (str): Path to the dataset JSON file.
+    fields (list): The Solr fields to fetch, all fields if None.
 
     """
-    # Create the parsed_datasets folder if it doesn't exist
-    if not os.path.exists(parsed_datasets_directory):
-        os.makedirs(parsed_datasets_directory)
-
     # Get datasets
     logger.info(f"Getting and parsing datasets ...")
-    docs: List[Dict] = fetch_solr_records(base_query, solr_url, username, password, start=0, rows=100)
+    docs: List[Dict] = fetch_solr_records(base_query, solr_url, username, password, start=0, rows=100,
+                                          fields=fields)
 
     # Extract individual datasets from the 'docs' array
-    for doc in docs:
-        # remove HTML tags from the description field
-        temp_list = []
-        for elem in doc.get("description", []):
-            temp_list.append(remove_html_tags(elem))
-        doc["description"] = temp_list
-        # shorten title and description
-        doc["name"] = shorten_list_or_string(doc.get("name", ""), title_limit, more_characters)
-        doc["description"] = shorten_list_or_string(doc.get("description", ""), description_limit, more_characters)
-
-        # get the id of the dataset and shorten it to 128 characters if it is longer
-        current_id: str | None = doc.get("id", None)
-        if current_id is None:
-            raise Exception(f"Dataset {doc} does not have 'id'!")
-        if len(current_id) > id_limit:
-            current_id = current_id[:id_limit]
-
-        dataset_filename = os.path.join(parsed_datasets_directory, f"{current_id}.json")
-        logger.debug(f"Saving dataset to {dataset_filename}")
-        try:
-            with open(dataset_filename, 'w') as dataset_file:
-                json.dump(doc, dataset_file, indent=2)
-        except Exception as ex:
-            logger.error(f"Error saving dataset to {dataset_filename}: {ex}")
-            print(doc)
-            exit()
+    # the files are written in the background, the writer raises the first error when closed
+    with OutputWriter() as writer:
+        for doc in docs:
+            current_id, doc = normalize_record(doc)
+
+            dataset_filename = os.path.join(parsed_datasets_directory, f"{current_id}.json")
+            logger.debug(f"Saving dataset to {dataset_filename}")
+            writer.write_json(dataset_filename, doc)
 
 
 def _harvest_datasets():
@@ -188,7 +795,10 @@ def _harvest_datasets():
     """
     # Get INEO records from Solr and save them as individual JSON files
     # current_path = os.path.dirname(os.path.abspath(__file__))
-    store_solr_response(base_query, solr_url, username, password, parsed_datasets_directory)
+    # only fetch the fields the templates need
+    fields = profiles_solr_fields(output_profiles)
+    logger.info(f"Fetching Solr fields: {fields if fields else 'all'}")
+    store_solr_response(base_query, solr_url, username, password, parsed_datasets_directory, fields)
     logger.debug(f"Datasets are saved in {parsed_datasets_directory}")
 
 
@@ -243,8 +853,8 @@ def resolve_path(ruc, path):
 
 
 def call_basex(query: str, host: str, port: int, user: str, password: str, action: str,
-               db: str = None, content_type: str = "application/json", http_caller=requests,
-               cooldown: int = 300) -> requests.Response:
+               db: str = None, content_type: str = "application/json", http_caller=None,
+               cooldown: int = 300, timeout: float | None = None, limited: bool = True) -> "requests.Response":
     """
     This function calls the basex query
 
@@ -253,6 +863,10 @@ def call_basex(query: str, host: str, port: int, user: str, password: str, actio
     port (int): The port of the basex server
     user (str): The user of the basex server
     password (str): The password of the basex server
+    http_caller: The HTTP client module or session, requests by default
+    timeout (float): The deadline of the call in seconds, basex_timeout by default
+    limited (bool): Go through basex_limiter. Bulk calls such as db:create bypass it, as their latency would reset
+                    the baseline the limiter detects latency spikes of md lookups with
 
     return (str): The response of the basex query
     """
@@ -263,13 +877,25 @@ def call_basex(query: str, host: str, port: int, user: str, password: str, actio
 
     # print(f"Executing the basex query: {query} on {url=} with {action=} ...")
     # logger.info(f"Executing the basex query: {query} on {url=} with {action=} ...")
+    if http_caller is None:
+        import requests
+
+        http_caller = requests
+    timeout = timeout or basex_timeout
     if action == "get":
-        response = http_caller.get(url, data=query, headers={"Content-Type": content_type})
+        method = http_caller.get
     elif action == "post":
-        response = http_caller.post(url, data=query, headers={"Content-Type": content_type})
+        method = http_caller.post
     else:
         raise Exception(f"Invalid action {action}; Valid actions are 'get' and 'post'")
 
+    if limited:
+        response = basex_breaker.call(basex_limiter.call, method, url, data=query,
+                                      headers={"Content-Type": content_type}, timeout=timeout)
+    else:
+        response = basex_breaker.call(method, url, data=query, headers={"Content-Type": content_type},
+                                      timeout=timeout)
+
     return response
 
 
@@ -281,8 +907,8 @@ def call_basex_with_query(query: str,
                           action: str,
                           db: str,
                           content_type: str = "application/json",
-                          http_caller=requests
-                          ) -> requests.Response:
+                          http_caller=None
+                          ) -> "requests.Response":
     """
     This function calls the basex query
 
@@ -370,7 +996,8 @@ def prepare_basex_tables(table_name: str,
     """.format(table_name=table_name, folder=folder)
 
     # Create the basex table
-    response = call_basex(content, host, port, user, password, action, content_type=content_type)
+    response = call_basex(content, host, port, user, password, action, content_type=content_type,
+                          timeout=basex_create_timeout, limited=False)
     if 199 < response.status_code < 300:
         logger.info(f"Basex table {table_name} created with folder {folder} ...")
     else:
@@ -417,7 +1044,38 @@ def process_vocabs(vocabs, vocab, val):
             logger.debug(f"There is no match for {val}")
 
 
-def retrieve_info(info, ruc, template_type: str, current_id) -> list | str | None | str:
+def query_basex_md(query: str, dbname: str) -> list | str | None:
+    """
+    Run a md query on basex and return the parsed JSON result, None if the result is empty.
+    """
+    # md queries only read, so slow calls are hedged with a duplicate call
+    response = basex_hedger.call(call_basex_with_query,
+                                 query,
+                                 basex_host,
+                                 8080,
+                                 "admin",
+                                 "pass",
+                                 "post",
+                                 dbname
+                                 )
+    assert (
+            response.status_code == 200
+    ), f"HttpError {response.status_code} Error running {query} on basex: {response.text}"
+    # check whether the query run was successful
+    try:
+        if response.text is not None and len(response.text) > 0:
+            resp = json.loads(response.text)
+        else:
+            resp = None
+    except json.JSONDecodeError:
+        # resp = "" + response.text
+        logger.error(f"Error running {query} on basex: {response.text}")
+        raise
+    return resp
+
+
+def retrieve_info(info, ruc, template_type: str, current_id, record: Dict | None = None,
+                  lookups: Dict | None = None) -> list | str | None | str:
     """
 
     This scripts parses and processes a set of input instructions from template.json (info, e.g. md:@queries/domains.rq:researchDomains,null)
@@ -442,6 +1100,8 @@ def retrieve_info(info, ruc, template_type: str, current_id) -> list | str | Non
 
     info: type  = 'str', input instruction from template.json (information after "<" in def traverse_data, e.g. md:@queries/domains.rq:researchDomains)
     ruc: type = 'dict', Rich User Contents (from Github Repository ineo-content). The ruc is processed and created in script FAIRdatasets_tools_harvester.py.
+    record: type = 'dict', the harvested record itself. If given, plain md paths are read from it instead of querying basex.
+    lookups: type = 'dict', cache of the ruc and md lookups of the current record, shared between templates.
     res: type = 'str' | 'list' | None, the function returns the value stored in the res variable, which represents the result of processing the instructions in the template.
 
     """
@@ -468,7 +1128,12 @@ def retrieve_info(info, ruc, template_type: str, current_id) -> list | str | Non
                 if template_key.endswith("[]"):
                     template_key = template_key[:-2]
 
-                info = resolve_path(ruc, template_key)
+                if lookups is not None and ("ruc", template_key) in lookups:
+                    info = lookups[("ruc", template_key)]
+                else:
+                    info = resolve_path(ruc, template_key)
+                    if lookups is not None:
+                        lookups[("ruc", template_key)] = info
                 logger.debug(f"The value of '{template_key}' in the RUC: {info}")
 
             if info is not None and len(info_parts) > 2:
@@ -563,61 +1228,50 @@ def retrieve_info(info, ruc, template_type: str, current_id) -> list | str | Non
                     logger.debug(f"path for the query[{file}]")
                     with open(file, "r") as file:
                         query = file.read()
-                if query is not None:
-                    # query = query.replace("{JSONL}", rumbledb_jsonl_path)
-                    query = query.replace("{ID}", current_id)
-                # This line generates a query string. It's a fallback query that is used when there is no external query file.
+                if query is None and record is not None:
+                    # the record is in memory, a plain path does not need a basex query
+                    resp = record.get(path)
                 else:
-                    if "datasets" == template_type:
-                        query = f"""
-                        declare namespace js="http://www.w3.org/2005/xpath-functions";
-
-                        for $i in js:map
-                        let $ID:="{current_id}"
-                         where $i/js:string[@key='id']=$ID
-                         return xml-to-json($i/js:*[@key='{path}'][1])
-                        """.format(current_id=current_id, path=path)
-                        # query = f'for $i in json-file("{rumbledb_jsonl_path}",10) where $i.id eq "{current_id}" return $i.{path}'
-                    elif "tools" == template_type:
-                        query = f"""
-                        declare namespace js="http://www.w3.org/2005/xpath-functions";
-
-                        for $i in js:map
-                        let $ID:="{current_id}"
-                         where $i/js:string[@key='identifier']=$ID
-                         return xml-to-json($i/js:*[@key='{path}'][1])
-                        """.format(current_id=current_id, path=path)
+                    if query is not None:
+                        # query = query.replace("{JSONL}", rumbledb_jsonl_path)
+                        query = query.replace("{ID}", current_id)
+                    # This line generates a query string. It's a fallback query that is used when there is no external query file.
                     else:
-                        raise TypeError(
-                            f"Invalid template type {template_type}; Valid types are 'datasets' and 'tools'")
-                        # query = f'for $i in json-file("{rumbledb_jsonl_path}",10) where $i.identifier eq "{current_id}" return $i.{path}'
-
-                logger.debug(f"basex query[{query}]")
-
-                dbname = "datasets" if "datasets" == template_type else "tools"
-
-                # timing the query call
-                response = call_basex_with_query(query,
-                                                 basex_host,
-                                                 8080,
-                                                 "admin",
-                                                 "pass",
-                                                 "post",
-                                                 dbname
-                                                 )
-                assert (
-                        response.status_code == 200
-                ), f"HttpError {response.status_code} Error running {query} on basex: {response.text}"
-                # check whether the query run was successful
-                try:
-                    if response.text is not None and len(response.text) > 0:
-                        resp = json.loads(response.text)
+                        if "datasets" == template_type:
+                            query = f"""
+                            declare namespace js="http://www.w3.org/2005/xpath-functions";
+
+                            for $i in js:map
+                            let $ID:="{current_id}"
+                             where $i/js:string[@key='id']=$ID
+                             return xml-to-json($i/js:*[@key='{path}'][1])
+                            """.format(current_id=current_id, path=path)
+                            # query = f'for $i in json-file("{rumbledb_jsonl_path}",10) where $i.id eq "{current_id}" return $i.{path}'
+                        elif "tools" == template_type:
+                            query = f"""
+                            declare namespace js="http://www.w3.org/2005/xpath-functions";
+
+                            for $i in js:map
+                            let $ID:="{current_id}"
+                             where $i/js:string[@key='identifier']=$ID
+                             return xml-to-json($i/js:*[@key='{path}'][1])
+                            """.format(current_id=current_id, path=path)
+                        else:
+                            raise TypeError(
+                                f"Invalid template type {template_type}; Valid types are 'datasets' and 'tools'")
+                            # query = f'for $i in json-file("{rumbledb_jsonl_path}",10) where $i.identifier eq "{current_id}" return $i.{path}'
+
+                    logger.debug(f"basex query[{query}]")
+
+                    dbname = "datasets" if "datasets" == template_type else "tools"
+
+                    # templates evaluated on the same record share the query results
+                    if lookups is not None and (dbname, query) in lookups:
+                        resp = lookups[(dbname, query)]
                     else:
-                        resp = None
-                except json.JSONDecodeError:
-                    # resp = "" + response.text
-                    logger.error(f"Error running {query} on basex: {response.text}")
-                    raise
+                        resp = query_basex_md(query, dbname)
+                        if lookups is not None:
+                            lookups[(dbname, query)] = resp
 
                 if resp is not None and len(resp) > 0:
                     if isinstance(resp, str) or isinstance(resp, list):
@@ -633,7 +1287,7 @@ def retrieve_info(info, ruc, template_type: str, current_id) -> list | str | Non
 
                 if vocab not in vocabs.keys():
                     # Load the vocabs file to be used later
-                    with open(f"/src/properties/{vocab}.json", "r") as vocabs_file:
+                    with open(os.path.join(vocabs_directory, f"{vocab}.json"), "r") as vocabs_file:
                         vocabs[vocab] = json.load(vocabs_file)
 
                 vocabs_list = []
@@ -693,7 +1347,8 @@ def retrieve_info(info, ruc, template_type: str, current_id) -> list | str | Non
     return res
 
 
-def traverse_data(template, ruc, template_type: str, current_id):
+def traverse_data(template, ruc, template_type: str, current_id, record: Dict | None = None,
+                  lookups: Dict | None = None):
     """
     This function traverses and processes the template.
 
@@ -714,13 +1369,13 @@ def traverse_data(template, ruc, template_type: str, current_id):
                 # Extract the information after the '<'
                 info = value.split("<")[1]
                 logger.error(f"curent info is {info}")
-                value = retrieve_info(info, ruc, template_type, current_id)
+                value = retrieve_info(info, ruc, template_type, current_id, record, lookups)
             elif isinstance(value, str) and value.startswith("lit#"):
                 info = value
-                value = retrieve_info(info, ruc, template_type, current_id)
+                value = retrieve_info(info, ruc, template_type, current_id, record, lookups)
             else:
                 # dealing with nested dictionaries or lists
-                value = traverse_data(value, ruc, template_type, current_id)
+                value = traverse_data(value, ruc, template_type, current_id, record, lookups)
             if value is not None:
                 if value == "null":
                     res[key] = None
@@ -734,10 +1389,10 @@ def traverse_data(template, ruc, template_type: str, current_id):
             if isinstance(item, str) and item.startswith("<"):
                 # Extract the information after the '<'
                 info = item.split("<")[1]
-                item = retrieve_info(info, ruc, template_type, current_id)
+                item = retrieve_info(info, ruc, template_type, current_id, record, lookups)
             else:
                 # dealing nested dictionaries or lists
-                item = traverse_data(item, ruc, template_type, current_id)
+                item = traverse_data(item, ruc, template_type, current_id, record, lookups)
             if item is not None:
                 if item == "null":
                     res.append(None)
@@ -746,31 +1401,82 @@ def traverse_data(template, ruc, template_type: str, current_id):
     return res
 
 
-def template(current_id: str, template_path: str, template_type: str = "datasets"):
+def load_template(template_path: str) -> dict:
     """
-    Main function
+    Load a template once and keep it in the templates cache, until the file is modified.
+    """
+    modified = os.stat(template_path).st_mtime_ns
+    if template_path not in templates or templates[template_path][0] != modified:
+        with open(template_path, "r") as file:
+            templates[template_path] = (modified, json.load(file))
+    return templates[template_path][1]
 
-    This script processes JSON data using a template (template.json) and retrieving information from it based on a set of instructions defined in template.py.
-    This function starts the process of traversing the template and retrieving the information from the Rich User Contents (RUC) and codemeta files (MD)
-    then merge them into an INEO json file to ultimately feed into the INEO API.
 
-    template: type = 'dict', the template file loaded as json, by default it is always a list of dictionaries as INEO supports multiple records
-    ruc: type = 'dict', the rich user contents file loaded as json, by default it is always a dictionary as it contains only one record
-    res: type = 'list', the result of combining the RUC and the MD based on the instructions set out in template.py.
+def file_fingerprint(path: str) -> str:
+    """
+    Return the sha256 of a file, "absent" if it does not exist. Hashes are cached until the file changes.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        fingerprints.pop(path, None)
+        return "absent"
+    cached = fingerprints.get(path)
+    if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+    with open(path, "rb") as file:
+        digest = hashlib.sha256(file.read()).hexdigest()
+    fingerprints[path] = (stat.st_mtime_ns, stat.st_size, digest)
+    return digest
+
+
+def template_dependencies(template_path: str) -> List[str]:
+    """
+    Return the files a template reads besides the record and the RUC: the template itself, its .rq queries and
+    its vocabularies.
+    """
+    dependencies = [template_path]
+    for path, vocab in iter_md_paths(load_template(template_path)):
+        if path.startswith("@"):
+            dependencies.append(path[1:])
+        if vocab:
+            dependencies.append(os.path.join(vocabs_directory, f"{vocab}.json"))
+    return list(dict.fromkeys(dependencies))
 
+
+def record_inputs(current_id: str, record: Dict | None = None) -> Dict[str, str]:
+    """
+    Fingerprint the record (the parsed_datasets file, or the harvested record itself) and the RUC of a record.
     """
-    logger.debug(f"### Processing {current_id} of type {template_type} with {template_path}")
-    # DSL template
-    # global template
-    logger.error(f"template_path: {template_path}")
-    with open(template_path, "r") as file:
-        template = json.load(file)
+    if record is None:
+        record_fingerprint = file_fingerprint(os.path.join(parsed_datasets_directory, f"{current_id}.json"))
+    else:
+        record_fingerprint = hashlib.sha256(json.dumps(record, sort_keys=True).encode("utf-8")).hexdigest()
+    return {
+        "record": record_fingerprint,
+        "ruc": file_fingerprint(os.path.join(rich_user_contents_directory, f"{current_id}.json")),
+    }
+
+
+def load_manifest(manifest_path: str = transform_manifest_path) -> Dict:
+    """
+    Load the transform manifest {output file: {"fingerprint": ..., "inputs": {input: sha256}}}.
+    """
+    if not os.path.isfile(manifest_path):
+        return {}
+    with open(manifest_path, "r") as file:
+        return json.load(file)
+
+
+def save_manifest(manifest: Dict, manifest_path: str = transform_manifest_path):
+    publish_file(manifest_path, json.dumps(manifest, indent=2).encode("utf-8"))
 
-    # Rich User Contents
-    ruc = None
 
-    # Load RUC dictionary or create a minimal RUC object if not existent
-    ruc_file_path = f"./data/rich_user_contents/{current_id}.json"
+def load_ruc(current_id: str) -> dict:
+    """
+    Load the RUC dictionary of a record or create a minimal RUC object if not existent.
+    """
+    ruc_file_path = os.path.join(rich_user_contents_directory, f"{current_id}.json")
 
     if os.path.exists(ruc_file_path):
         with open(ruc_file_path, "r") as json_file:
@@ -778,30 +1484,300 @@ def template(current_id: str, template_path: str, template_type: str = "datasets
         logger.debug(f"RUC contents: {ruc}")
     else:
         ruc = create_minimal_ruc(current_id)
+    return ruc
 
-    # Combine codemeta/datasets and RUC using the template
-    logger.error(f"current id {current_id}")
-    res = traverse_data(template, ruc, template_type, current_id)
-
-    # Create folders if they don't exist
-    tools_folder = processed_tools_folder
-    datasets_folder = processed_datasets_folder
 
-    if not os.path.exists(tools_folder):
-        os.makedirs(tools_folder)
+def product_filename(current_id: str, folder_name: str) -> str:
+    return os.path.join(folder_name, f"{current_id}_processed.json")
 
-    if not os.path.exists(datasets_folder):
-        os.makedirs(datasets_folder)
 
-    logger.error(f"Processing result: {res} of type {type(res)}")
-    folder_name = datasets_folder
+def write_product(current_id: str, res, folder_name: str, writer: OutputWriter | None = None) -> str:
+    """
+    Save a processed record as {current_id}_processed.json in the given folder, with precompressed copies next to it
+    ({filename}.gz and, if brotli is installed, {filename}.br) so that get_file can send them without compressing
+    per request. The files are queued on the writer if given, and published atomically.
 
-    filename = os.path.join(folder_name, f"{current_id}_processed.json")
+    return (str): The file name of the processed record
+    """
+    filename = product_filename(current_id, folder_name)
 
-    with open(filename, 'w') as file:
-        json.dump(res, file, indent=2)
+    if writer is not None:
+        writer.write_json(filename, res, sidecars=True)
+    else:
+        for path, content in encode_output(filename, res, sidecars=True):
+            publish_file(path, content)
 
     logger.info(f"JSON files saved successfully. {filename}")
+    return filename
+
+
+def transform_record(current_id: str, profiles: List[tuple[str, str, str]], record: Dict | None = None,
+                     manifest: Dict | None = None, writer: OutputWriter | None = None) -> List:
+    """
+    Apply several templates to one record in a single pass. The RUC is loaded once, and every ruc and md lookup
+    is done once and shared by all templates. Each template writes to its own folder.
+
+    When a manifest is given, outputs whose inputs (record, RUC, template, queries and vocabularies) have the same
+    fingerprint as in the manifest are not generated again, and the manifest is updated for the generated outputs.
+
+    profiles (list): (template path, template type, output folder) of each template, see output_profiles
+    record (dict): The harvested record; plain md paths are read from it instead of basex when given.
+    manifest (dict): The transform manifest, see load_manifest
+    writer (OutputWriter): Queue the outputs on this writer instead of writing them directly
+
+    return (list): The processed record of each profile, in order of the profiles; None if it was up to date
+    """
+    inputs = record_inputs(current_id, record) if manifest is not None else {}
+    ruc = None
+    lookups = {}
+    results = []
+    for profile_template_path, template_type, folder_name in profiles:
+        filename = product_filename(current_id, folder_name)
+        if manifest is not None:
+            profile_inputs = {**inputs, **{path: file_fingerprint(path)
+                                           for path in template_dependencies(profile_template_path)}}
+            fingerprint = hashlib.sha256(json.dumps(profile_inputs, sort_keys=True).encode("utf-8")).hexdigest()
+            if manifest.get(filename, {}).get("fingerprint") == fingerprint and os.path.isfile(filename):
+                logger.debug(f"{filename} is up to date")
+                results.append(None)
+                continue
+
+        if ruc is None:
+            ruc = load_ruc(current_id)
+        res = traverse_data(load_template(profile_template_path), ruc, template_type, current_id, record, lookups)
+        write_product(current_id, res, folder_name, writer)
+        if manifest is not None:
+            manifest[filename] = {"fingerprint": fingerprint, "inputs": profile_inputs}
+        results.append(res)
+    return results
+
+
+def parse_profile(value: str) -> tuple[str, str, str]:
+    """
+    Parse an output profile given as "template path[:template type[:output folder]]".
+    Without a folder, the default template is written to processed_datasets_folder and any other template to
+    processed_jsonfiles_{template name}.
+    """
+    parts = value.split(":")
+    profile_template_path = parts[0]
+    template_type = parts[1] if len(parts) > 1 and parts[1] else "datasets"
+    if len(parts) > 2 and parts[2]:
+        folder_name = parts[2]
+    elif os.path.normpath(profile_template_path) == os.path.normpath(template_path):
+        folder_name = processed_datasets_folder
+    else:
+        template_name = os.path.splitext(os.path.basename(profile_template_path))[0]
+        folder_name = f"processed_jsonfiles_{template_name}"
+    return profile_template_path, template_type, folder_name
+
+
+def check_profiles(profiles: List[tuple[str, str, str]]):
+    """
+    Raise a ValueError if several profiles write to the same output folder, as their outputs (and manifest
+    entries) would overwrite each other.
+    """
+    folders = {}
+    for profile_template_path, _, folder_name in profiles:
+        folder = os.path.normpath(folder_name)
+        if folder in folders:
+            raise ValueError(f"Profiles {folders[folder]} and {profile_template_path} both write to {folder_name}")
+        folders[folder] = profile_template_path
+
+
+def template(current_id: str, template_path: str, template_type: str = "datasets", record: Dict | None = None):
+    """
+    Main function
+
+    This script processes JSON data using a template (template.json) and retrieving information from it based on a set of instructions defined in template.py.
+    This function starts the process of traversing the template and retrieving the information from the Rich User Contents (RUC) and codemeta files (MD)
+    then merge them into an INEO json file to ultimately feed into the INEO API.
+
+    Kept for single records; it is transform_record with one profile writing to processed_datasets_folder.
+
+    record: type = 'dict', the harvested record; plain md paths are read from it instead of basex when given.
+
+    return (dict): The processed record
+    """
+    return transform_record(current_id, [(template_path, template_type, processed_datasets_folder)], record)[0]
+
+
+def _resolve_ref(spec: dict, node: dict) -> dict:
+    """
+    Follow local $ref pointers (e.g. "#/components/responses/Product") in the OpenAPI spec.
+    """
+    while isinstance(node, dict) and "$ref" in node and node["$ref"].startswith("#/"):
+        target = spec
+        for step in node["$ref"][2:].split("/"):
+            target = target[step.replace("~1", "/").replace("~0", "~")]
+        node = target
+    return node
+
+
+def _nullable_to_jsonschema(node):
+    """
+    Translate the OpenAPI 3.0 "nullable: true" keyword, which JSON Schema does not know, into schemas which also
+    accept null: the type becomes [type, "null"], and schemas without a type (e.g. a $ref) become
+    anyOf [schema, {"type": "null"}].
+    """
+    if isinstance(node, list):
+        return [_nullable_to_jsonschema(item) for item in node]
+    if not isinstance(node, dict):
+        return node
+    node = {key: _nullable_to_jsonschema(value) for key, value in node.items()}
+    if node.get("nullable") is not True:
+        return node
+    del node["nullable"]
+    if "enum" in node and None not in node["enum"]:
+        node["enum"] = [*node["enum"], None]
+    if isinstance(node.get("type"), str):
+        node["type"] = [node["type"], "null"]
+    elif isinstance(node.get("type"), list):
+        node["type"] = [*node["type"], "null"] if "null" not in node["type"] else node["type"]
+    else:
+        return {"anyOf": [node, {"type": "null"}]}
+    return node
+
+
+def load_product_validator(spec_path: str = skg_if_spec_path):
+    """
+    Compile the SKG-IF product schema once into a reusable validator.
+    The schema is the application/json response of GET /products/{id}, which is what the Prism proxy validates against.
+
+    spec_path (str): The SKG-IF OpenAPI YAML file
+
+    return: The jsonschema validator, or None if the spec or jsonschema and pyyaml are not available
+    """
+    global product_validator
+
+    if product_validator is not None:
+        return product_validator or None
+
+    product_validator = False
+    try:
+        import yaml
+        from jsonschema import Draft4Validator, Draft202012Validator
+    except ImportError:
+        logger.info("jsonschema or pyyaml not installed! Skipping schema validation")
+        return None
+
+    if not os.path.isfile(spec_path):
+        logger.info(f"{spec_path} not found! Skipping schema validation")
+        return None
+
+    with open(spec_path, "r") as file:
+        spec = yaml.safe_load(file)
+
+    schema = None
+    for path, operations in spec.get("paths", {}).items():
+        if path.startswith("/products/") and "get" in operations:
+            responses = operations["get"].get("responses", {})
+            response = _resolve_ref(spec, responses.get("200", responses.get(200, {})))
+            schema = response.get("content", {}).get("application/json", {}).get("schema")
+            break
+    if schema is None:
+        logger.error(f"No product schema found in {spec_path}! Skipping schema validation")
+        return None
+
+    # keep the spec as root document so that the $refs to #/components/... resolve
+    # OpenAPI 3.0 schemas are close to draft 4, OpenAPI 3.1 uses draft 2020-12
+    if str(spec.get("openapi", "")).startswith("3.1"):
+        validator_class = Draft202012Validator
+    else:
+        # OpenAPI 3.0 marks nullable values with its own keyword, like Prism, translate it before compiling
+        validator_class = Draft4Validator
+        spec = _nullable_to_jsonschema(spec)
+        schema = _nullable_to_jsonschema(schema)
+    product_validator = validator_class({**spec, **schema})
+    logger.info(f"Compiled product schema from {spec_path}")
+    return product_validator
+
+
+def reset_validation_summary():
+    """
+    Start a new validation summary for a transform run.
+    """
+    global validation_summary
+    validation_summary = {"valid": 0, "invalid": 0, "errors": {}}
+
+
+def validate_products(products: Dict[str, dict], manifest: Dict | None = None,
+                      folder_name: str = processed_datasets_folder) -> Dict[str, list]:
+    """
+    Validate a batch of processed products against the SKG-IF product schema and record the results
+    in the validation summary, and in the manifest entries of the products if a manifest is given.
+
+    products (dict): {id: processed product}
+    manifest (dict): The transform manifest, see load_manifest
+    folder_name (str): The output folder of the products
+
+    return (dict): {id: list of error messages} for the invalid products
+    """
+    validator = load_product_validator()
+    if validator is None:
+        return {}
+    if not validation_summary:
+        reset_validation_summary()
+
+    failures = {}
+    for current_id, product in products.items():
+        errors = [
+            f"{'/'.join(str(step) for step in error.absolute_path) or '<root>'}: {error.message}"
+            for error in validator.iter_errors(product)
+        ]
+        if errors:
+            failures[current_id] = errors
+            logger.warning(f"{current_id} is invalid: {errors}")
+        if manifest is not None and product_filename(current_id, folder_name) in manifest:
+            manifest[product_filename(current_id, folder_name)]["errors"] = errors
+    validation_summary["valid"] += len(products) - len(failures)
+    validation_summary["invalid"] += len(failures)
+    validation_summary["errors"].update(failures)
+    return failures
+
+
+def summarize_validation(manifest: Dict, ids: Iterable[str], folder_name: str = processed_datasets_folder) -> Dict:
+    """
+    Rebuild the validation summary of the products of ids from the results kept in the manifest, so that products
+    skipped because they were up to date keep the result of their last validation. Products without a result yet
+    are read and validated.
+
+    return (dict): The validation summary
+    """
+    reset_validation_summary()
+    if load_product_validator() is None:
+        return validation_summary
+
+    unvalidated = {}
+    for current_id in ids:
+        filename = product_filename(current_id, folder_name)
+        entry = manifest.get(filename)
+        if entry is None:
+            continue
+        if "errors" not in entry:
+            if os.path.isfile(filename):
+                with open(filename, "r") as file:
+                    unvalidated[current_id] = json.load(file)
+            if len(unvalidated) >= validation_batch_size:
+                validate_products(unvalidated, manifest, folder_name)
+                unvalidated = {}
+        elif entry["errors"]:
+            validation_summary["invalid"] += 1
+            validation_summary["errors"][current_id] = entry["errors"]
+        else:
+            validation_summary["valid"] += 1
+    validate_products(unvalidated, manifest, folder_name)
+    return validation_summary
+
+
+def write_validation_summary(summary_path: str = validation_summary_path):
+    """
+    Save the validation summary of the transform run.
+    """
+    if not validation_summary:
+        return
+    publish_file(summary_path, json.dumps(validation_summary, indent=2).encode("utf-8"))
+    logger.info(f"Validation: {validation_summary['valid']} valid, {validation_summary['invalid']} invalid; "
+                f"see {summary_path}")
 
 
 def get_accept_header(accept: str | None):
@@ -817,16 +1793,205 @@ def get_accept_header(accept: str | None):
     return accept_header
 
 
-def create_response(data: dict | None, accept: str):
+def _escape_xml(text: str) -> str:
+    """
+    Escape text and attribute values the same way as dicttoxml.
+    """
+    return (text.replace("&", "&amp;").replace('"', "&quot;").replace("'", "&apos;")
+            .replace("<", "&lt;").replace(">", "&gt;"))
+
+
+@functools.lru_cache(maxsize=4096)
+def _xml_tag(key: str) -> tuple[str, str]:
+    """
+    Return the element name and the extra attributes for a dictionary key, following dicttoxml:
+    numeric keys get an "n" prefix, spaces become underscores and other invalid names become <key name="...">.
+    """
+    key = _escape_xml(str(key))
+    if xml_name_pattern.match(key):
+        return key, ""
+    if key.isdigit():
+        return f"n{key}", ""
+    try:
+        return f"n{float(key)}", ""
+    except ValueError:
+        pass
+    if xml_name_pattern.match(key.replace(" ", "_")):
+        return key.replace(" ", "_"), ""
+    return "key", f' name="{key}"'
+
+
+def _xml_type(value) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, dict):
+        return "dict"
+    if isinstance(value, (list, tuple)):
+        return "list"
+    if isinstance(value, (int, float)):
+        return type(value).__name__
+    return "str"
+
+
+def _render_xml_value(name: str, attrs: str, value, list_item: bool = False) -> Iterator[str]:
+    value_type = _xml_type(value)
+    yield f'<{name}{attrs} type="{value_type}">'
+    if value_type == "dict":
+        for key, item in value.items():
+            yield from _render_xml_value(*_xml_tag(key), item)
+    elif value_type == "list":
+        for item in value:
+            yield from _render_xml_value("item", "", item, list_item=True)
+    elif value_type == "bool":
+        # like dicttoxml: lowercase in dictionaries, Python's str() for list items
+        yield str(value) if list_item else "true" if value else "false"
+    elif value_type != "null":
+        yield _escape_xml(str(value))
+    yield f"</{name}>"
+
+
+def render_xml(data: dict) -> Iterator[str]:
+    """
+    Render a product as XML fragments, in the same layout as dicttoxml: a <root> element, a type attribute on every
+    element and <item> elements for list entries.
+    """
+    yield '<?xml version="1.0" encoding="UTF-8" ?><root>'
+    for key, value in data.items():
+        yield from _render_xml_value(*_xml_tag(key), value)
+    yield "</root>"
+
+
+def render_text(data, prefix: str = "") -> Iterator[str]:
+    """
+    Render a product as "key: value" lines. Nested values are flattened into dotted keys with list indexes,
+    e.g. "titles.nl[0]: ...".
+    """
+    if isinstance(data, dict) and data:
+        for key, value in data.items():
+            yield from render_text(value, f"{prefix}.{key}" if prefix else str(key))
+    elif isinstance(data, list) and data:
+        for index, value in enumerate(data):
+            yield from render_text(value, f"{prefix}[{index}]")
+    elif prefix:
+        yield f"{prefix}: {data}\n"
+
+
+def _encode_chunks(fragments: Iterable[str], chunk_size: int) -> Iterator[bytes]:
+    """
+    Join rendered fragments into encoded chunks of about chunk_size bytes.
+    """
+    buffer = []
+    size = 0
+    for fragment in fragments:
+        buffer.append(fragment)
+        size += len(fragment)
+        if size >= chunk_size:
+            yield "".join(buffer).encode("utf-8")
+            buffer = []
+            size = 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+
+def compress(content: bytes, encoding: str, sidecar: bool = False) -> bytes:
+    """
+    Compress content with gzip or brotli. Sidecars are written once, so they use the highest compression level.
+    """
+    if encoding == "br":
+        return brotli.compress(content, quality=11 if sidecar else 4)
+    return gzip.compress(content, compresslevel=9 if sidecar else 6, mtime=0)
+
+
+def choose_encoding(accept_encoding: str | None, encodings: Iterable[str] = ("br", "gzip")) -> str | None:
+    """
+    Pick the preferred content encoding from the Accept-Encoding header among the given encodings.
+    """
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+    candidates = [
+        encoding for encoding in encodings
+        if (encoding != "br" or brotli is not None) and weights.get(encoding, weights.get("*", 0.0)) > 0
+    ]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda encoding: weights.get(encoding, weights.get("*", 0.0)))
+
+
+def compressed_response(content: bytes, media_type: str, encoding: str | None) -> Response:
+    """
+    Return content compressed on the fly with the given encoding, unless it is too small to be worth it.
+    """
+    if encoding is None or len(content) < compression_minimum_size:
+        return Response(content=content, media_type=media_type, headers={"Vary": "Accept-Encoding"})
+    return Response(content=compress(content, encoding), media_type=media_type,
+                    headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"})
+
+
+def file_response(file_path: str, media_type: str, accept_encoding: str | None) -> Response:
+    """
+    Send a file as is, using its precompressed sidecar when the client accepts it and the sidecar is up to date,
+    and compressing on the fly otherwise.
+    """
+    encoding = choose_encoding(accept_encoding)
+    if encoding is not None:
+        sidecar_path = file_path + compressed_sidecars.get(encoding, f".{encoding}")
+        if os.path.isfile(sidecar_path) and os.path.getmtime(sidecar_path) >= os.path.getmtime(file_path):
+            with open(sidecar_path, "rb") as file:
+                return Response(content=file.read(), media_type=media_type,
+                                headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"})
+    with open(file_path, "rb") as file:
+        return compressed_response(file.read(), media_type, encoding)
+
+
+def _gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _render_response(fragments: Iterable[str], media_type: str, encoding: str | None = None) -> Response:
+    """
+    Return the rendered body as a single response if it fits in one chunk, otherwise stream it in chunks.
+    Streamed bodies are gzipped on the fly when encoding is "gzip".
+    """
+    chunks = _encode_chunks(fragments, response_chunk_size)
+    first = next(chunks, b"")
+    second = next(chunks, None)
+    if second is None:
+        return compressed_response(first, media_type, encoding)
+    chunks = itertools.chain([first, second], chunks)
+    if encoding == "gzip":
+        return StreamingResponse(_gzip_chunks(chunks), media_type=media_type,
+                                 headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"})
+    return StreamingResponse(chunks, media_type=media_type)
+
+
+def create_response(data: dict | None, accept: str, accept_encoding: str | None = None):
     data = data or {}
     if accept == "application/xml":
-        xml_response = dicttoxml(data)
-        return Response(content=xml_response, media_type="application/xml")
+        return _render_response(render_xml(data), "application/xml", choose_encoding(accept_encoding, ("gzip",)))
     elif accept == "text/plain":
-        plain_text_response = "\n".join([f"{key}: {value}" for key, value in data.items()])
-        return Response(content=plain_text_response, media_type="text/plain")
+        return _render_response(render_text(data), "text/plain", choose_encoding(accept_encoding, ("gzip",)))
     else:
-        return JSONResponse(content=data)
+        response = JSONResponse(content=data)
+        return compressed_response(response.body, response.media_type, choose_encoding(accept_encoding))
+
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root():
@@ -835,17 +2000,20 @@ async def read_root():
 
 # @app.get("/validate/{file_path}")
 @app.get("/products/{file_path}")
-async def get_file(file_path: str, accept: str | None = Query(None)):
+async def get_file(file_path: str, accept: str | None = Query(None), accept_encoding: str | None = Header(None)):
     logger.warning(f"original file_path: {file_path}")
     filename = os.path.basename(file_path)
     logger.warning(f"filename basename: {filename}")
-    file_path = os.path.join("/app/data", filename)
+    file_path = os.path.join(products_directory, filename)
     logger.warning(f"file_path: {file_path}")
     accept_header = get_accept_header(accept)
     if os.path.isfile(file_path):
+        if accept_header == "application/json":
+            # the file is already JSON, send it (or its precompressed sidecar) as is
+            return file_response(file_path, accept_header, accept_encoding)
         with open(file_path, "r") as file:
             data = json.load(file)
-        return create_response(data, accept_header)
+        return create_response(data, accept_header, accept_encoding)
     else:
         return JSONResponse(content={"error": f"File not found {file_path}"}, status_code=404)
 
@@ -869,7 +2037,7 @@ async def get_file(file_path: str, accept: str | None = Query(None)):
 
 
 @app.get("/products")
-async def get_products(accept: str | None = Query(None)):
+async def get_products(accept: str | None = Query(None), accept_encoding: str | None = Header(None)):
     global processed_files
     accept_header = get_accept_header(accept)
 
@@ -878,7 +2046,8 @@ async def get_products(accept: str | None = Query(None)):
     k, v = next(iter(processed_files.items()))
     logger.error(f"Returning {k} - {v}")
 
-    return create_response({"accept": accept_header, "total": len(processed_files), k: v}, accept_header)
+    return create_response({"accept": accept_header, "total": len(processed_files), k: v}, accept_header,
+                           accept_encoding)
 
 
 @app.get("/fetchall", response_class=HTMLResponse)
@@ -893,6 +2062,14 @@ async def fetch_all():
     return HTMLResponse(content="<h1>Fetched records from solr<h1>", status_code=200)
 
 
+def list_file_ids(directory: str, file_type: str = "json") -> List[str]:
+    """
+    List the ids of the files in a directory, without loading them.
+    """
+    return [get_id_from_file_name(file_name) for file_name in os.listdir(directory)
+            if file_name.endswith(f".{file_type}")]
+
+
 def load_files(directory: str, file_type: str = "json") -> Dict:
     """
     Load files from a directory and return a dictionary with the file content.
@@ -906,6 +2083,22 @@ def load_files(directory: str, file_type: str = "json") -> Dict:
     return files
 
 
+@app.get("/metrics")
+async def get_metrics():
+    return JSONResponse(content={
+        "solr": solr_limiter.metrics(),
+        "basex": basex_limiter.metrics(),
+        "solr_circuit": solr_breaker.metrics(),
+        "basex_circuit": basex_breaker.metrics(),
+        "basex_hedging": basex_hedger.metrics(),
+    })
+
+
+@app.get("/validation")
+async def get_validation_summary():
+    return JSONResponse(content=validation_summary)
+
+
 @app.get("/initdb", response_class=HTMLResponse)
 def init_db():
     # initialize basex
@@ -919,12 +2112,310 @@ def init_db():
 
 
 @app.get("/transform", response_class=HTMLResponse)
-async def transform():
+async def transform(force: bool = Query(False), shard_index: int = Query(0), shard_count: int = Query(1)):
     # transform records
     logger.info("Transforming datasets ...")
-    ineo_records = load_files(parsed_datasets_directory)  # {id: location}
+    ids = list_file_ids(parsed_datasets_directory)
 
-    for current_id in tqdm(ineo_records.keys()):
-        template(current_id, template_path, "datasets")
+    try:
+        check_shard(shard_index, shard_count)
+    except ValueError as ex:
+        raise HTTPException(status_code=400, detail=str(ex))
+    run_transform(ids, force=force, shard_index=shard_index, shard_count=shard_count)
 
     return HTMLResponse(content="<h1>Transformed records<h1>", status_code=200)
+
+
+def shard_of(current_id: str, shard_count: int) -> int:
+    """
+    Return the shard of a record id. The shard only depends on the id, so every node selects the same partition.
+    """
+    return int(hashlib.sha1(current_id.encode("utf-8")).hexdigest()[:8], 16) % shard_count
+
+
+def shard_path(name: str, shard_index: int, shard_count: int) -> str:
+    return os.path.join(shards_directory, f"{name}-{shard_index}-of-{shard_count}.json")
+
+
+def check_shard(shard_index: int, shard_count: int):
+    """
+    Raise a ValueError if shard_index is not one of the shard_count shards.
+    """
+    if shard_count < 1:
+        raise ValueError(f"Invalid shard count {shard_count}; there must be at least one shard")
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f"Invalid shard {shard_index}; valid shards are 0 to {shard_count - 1}")
+
+
+def directory_fingerprint(directory: str) -> str:
+    """
+    Return the sha256 of the names, sizes and modification times of the files in a directory. Nodes sharing the
+    data volume see the same fingerprint, without reading the files.
+    """
+    digest = hashlib.sha256()
+    if os.path.isdir(directory):
+        for entry in sorted(os.scandir(directory), key=lambda entry: entry.name):
+            if entry.is_file():
+                stat = entry.stat()
+                digest.update(f"{entry.name}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def transform_inputs_fingerprint(profiles: List[tuple[str, str, str]]) -> str:
+    """
+    Fingerprint the inputs of a whole transform: the harvested records, the RUCs and the files of every template.
+    Completion manifests are stamped with it, so merge_shards can tell them apart from those of an earlier refresh.
+    """
+    inputs = {
+        "parsed_datasets": directory_fingerprint(parsed_datasets_directory),
+        "rich_user_contents": directory_fingerprint(rich_user_contents_directory),
+        "profiles": [[profile_template_path, template_type, folder_name,
+                      {path: file_fingerprint(path) for path in template_dependencies(profile_template_path)}]
+                     for profile_template_path, template_type, folder_name in profiles],
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def run_transform(ids: List[str], profiles: List[tuple[str, str, str]] = output_profiles, force: bool = False,
+                  shard_index: int = 0, shard_count: int = 1, run_id: str | None = None) -> int:
+    """
+    Transform the harvested records with all profiles in a single pass and validate the products of the first profile.
+    Outputs whose inputs did not change since the last run are skipped, unless force is set.
+
+    With shard_count > 1 only the ids of shard shard_index are transformed, so that several nodes sharing the data
+    volume can each run one shard. Each shard keeps its own transform manifest and validation summary, and writes
+    a completion manifest to shards_directory when done; merge_shards combines them. The completion manifest of an
+    earlier run of the shard is removed when the shard starts, and the new one is stamped with the run id and the
+    fingerprint of the transform inputs.
+
+    ids (list): The ids of the records in parsed_datasets
+    profiles (list): (template path, template type, output folder) of each template
+    force (bool): Regenerate all outputs
+    shard_index (int): The shard to transform, from 0 to shard_count - 1
+    shard_count (int): The number of shards
+    run_id (str): Identifies the refresh the shard belongs to, recorded in the completion manifest
+
+    return (int): The number of records with at least one regenerated output
+    """
+    check_profiles(profiles)
+    check_shard(shard_index, shard_count)
+    manifest_path = transform_manifest_path
+    summary_path = validation_summary_path
+    if shard_count > 1:
+        ids = [current_id for current_id in ids if shard_of(current_id, shard_count) == shard_index]
+        manifest_path = shard_path("transform_manifest", shard_index, shard_count)
+        summary_path = shard_path("validation_summary", shard_index, shard_count)
+        os.makedirs(shards_directory, exist_ok=True)
+        # a crash during this run must not leave the completion of an earlier run behind
+        try:
+            os.remove(shard_path("shard", shard_index, shard_count))
+        except FileNotFoundError:
+            pass
+        inputs_fingerprint = transform_inputs_fingerprint(profiles)
+        logger.info(f"Transforming shard {shard_index} of {shard_count}: {len(ids)} records")
+
+    manifest = {} if force else load_manifest(manifest_path)
+    # vocabularies may have changed since the last run
+    vocabs.clear()
+    reset_validation_summary()
+    products = {}
+    transformed = 0
+    from tqdm import tqdm
+
+    with OutputWriter() as writer:
+        for current_id in tqdm(ids):
+            results = transform_record(current_id, profiles, manifest=manifest, writer=writer)
+            transformed += any(res is not None for res in results)
+            if results[0] is not None:
+                products[current_id] = results[0]
+            if len(products) >= validation_batch_size:
+                validate_products(products, manifest, profiles[0][2])
+                products = {}
+        validate_products(products, manifest, profiles[0][2])
+    # the products which were up to date keep the validation result of their last run
+    summarize_validation(manifest, ids, profiles[0][2])
+    write_validation_summary(summary_path)
+    save_manifest(manifest, manifest_path)
+    logger.info(f"Transformed {transformed} records, {len(ids) - transformed} were up to date")
+
+    if shard_count > 1:
+        completion = {
+            "shard_index": shard_index,
+            "shard_count": shard_count,
+            "run_id": run_id,
+            "inputs": inputs_fingerprint,
+            "completed": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "transformed": transformed,
+            "outputs": {current_id: [product_filename(current_id, folder_name) for _, _, folder_name in profiles]
+                        for current_id in ids},
+        }
+        publish_file(shard_path("shard", shard_index, shard_count), json.dumps(completion, indent=2).encode("utf-8"),
+                     fsync=True)
+    return transformed
+
+
+def merge_shards(shard_count: int, ids: List[str] | None = None,
+                 profiles: List[tuple[str, str, str]] = output_profiles, run_id: str | None = None) -> Dict:
+    """
+    Check that all shards of a sharded transform are complete and build the combined product index
+    {id: [output files]} and validation summary. Completion manifests of other runs (another run id, or other
+    records, RUCs or templates) do not count.
+
+    shard_count (int): The number of shards
+    ids (list): The ids that should have been transformed, by default the ids in parsed_datasets
+    profiles (list): (template path, template type, output folder) of each template the shards applied
+    run_id (str): The run id the shards were started with
+
+    return (dict): The product index
+    """
+    check_shard(0, shard_count)
+    if ids is None:
+        ids = list_file_ids(parsed_datasets_directory)
+    inputs_fingerprint = transform_inputs_fingerprint(profiles)
+
+    problems = []
+    index = {}
+    summary = {"valid": 0, "invalid": 0, "errors": {}}
+    for shard_index in range(shard_count):
+        completion_path = shard_path("shard", shard_index, shard_count)
+        if not os.path.isfile(completion_path):
+            problems.append(f"shard {shard_index} is not completed, {completion_path} is missing")
+            continue
+        with open(completion_path, "r") as file:
+            completion = json.load(file)
+        if completion.get("run_id") != run_id:
+            problems.append(f"shard {shard_index} was completed by run {completion.get('run_id')}, not {run_id}")
+            continue
+        if completion.get("inputs") != inputs_fingerprint:
+            problems.append(f"shard {shard_index} was completed for other records, RUCs or templates, "
+                            f"it is left over from an earlier run")
+            continue
+        for current_id, outputs in completion["outputs"].items():
+            if shard_of(current_id, shard_count) != shard_index:
+                problems.append(f"{current_id} does not belong to shard {shard_index}")
+            missing = [filename for filename in outputs if not os.path.isfile(filename)]
+            if missing:
+                problems.append(f"{current_id} of shard {shard_index} is missing {missing}")
+            index[current_id] = outputs
+
+        summary_path = shard_path("validation_summary", shard_index, shard_count)
+        if os.path.isfile(summary_path):
+            with open(summary_path, "r") as file:
+                shard_summary = json.load(file)
+            summary["valid"] += shard_summary["valid"]
+            summary["invalid"] += shard_summary["invalid"]
+            summary["errors"].update(shard_summary["errors"])
+
+    missing_ids = set(ids) - set(index)
+    if missing_ids:
+        problems.append(f"{len(missing_ids)} records were not transformed by any shard, e.g. {sorted(missing_ids)[:5]}")
+    if problems:
+        for problem in problems:
+            logger.error(problem)
+        raise Exception(f"Sharded transform of {shard_count} shards is incomplete: {len(problems)} problems")
+
+    publish_file(product_index_path, json.dumps(index, indent=2).encode("utf-8"))
+    publish_file(validation_summary_path, json.dumps(summary, indent=2).encode("utf-8"))
+    logger.info(f"Merged {shard_count} shards: {len(index)} records in {product_index_path}")
+    return index
+
+
+def run_pipeline(workers: int = 8, batch_size: int = 100, profiles: List[tuple[str, str, str]] = output_profiles,
+                 force: bool = False):
+    """
+    Harvest, normalize and transform all records in a single pass, without the parsed_datasets round-trip.
+    Each Solr page of batch_size records is normalized and transformed by a pool of workers while the next pages
+    are fetched. Plain md paths are read from the harvested record, only .rq queries still go to basex.
+
+    workers (int): The number of records transformed in parallel
+    batch_size (int): The number of records fetched per Solr request
+    profiles (list): (template path, template type, output folder) of each template, evaluated in one pass per record
+    force (bool): Regenerate all outputs, also the ones whose inputs did not change since the last run
+
+    return (int): The number of records with at least one regenerated output
+    """
+    check_profiles(profiles)
+    fields = profiles_solr_fields(profiles)
+    manifest = {} if force else load_manifest()
+    vocabs.clear()
+    logger.info(f"Running the pipeline with {workers} workers and batches of {batch_size} ...")
+
+    def process(item):
+        current_id, record = item
+        return transform_record(current_id, profiles, record, manifest, writer)
+
+    reset_validation_summary()
+    ids = []
+    transformed = 0
+    with OutputWriter() as writer, concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for docs in iter_solr_pages(base_query, solr_url, username, password, rows=batch_size, fields=fields):
+            records = dict(normalize_record(doc) for doc in docs)
+            results = dict(zip(records.keys(), executor.map(process, records.items())))
+            validate_products({current_id: res[0] for current_id, res in results.items() if res[0] is not None},
+                              manifest, profiles[0][2])
+            ids.extend(results)
+            transformed += sum(any(res is not None for res in outputs) for outputs in results.values())
+            logger.info(f"Transformed {transformed} of {len(ids)} records, "
+                        f"limits: solr {solr_limiter.metrics()['limit']}, basex {basex_limiter.metrics()['limit']}")
+    summarize_validation(manifest, ids, profiles[0][2])
+    write_validation_summary()
+    save_manifest(manifest)
+    return transformed
+
+
+def main(argv: List[str] | None = None):
+    """
+    Command line entry point for running the pipeline or the transform headless, e.g. in a batch job.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Harvest and transform records from Solr.")
+    parser.add_argument("--log-level", default="WARNING", help="Logging level, e.g. INFO or DEBUG")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    pipeline_parser = subparsers.add_parser("pipeline", help="Harvest, normalize and transform in a single pass")
+    pipeline_parser.add_argument("--workers", type=int, default=8, help="Records transformed in parallel")
+    pipeline_parser.add_argument("--batch-size", type=int, default=100, help="Records fetched per Solr request")
+    transform_parser = subparsers.add_parser("transform", help="Transform the records in parsed_datasets")
+
+    merge_parser = subparsers.add_parser("merge-shards", help="Check a sharded transform and build the product index")
+    merge_parser.add_argument("--shard-count", type=int, required=True, help="The number of shards")
+
+    for subparser in (pipeline_parser, transform_parser, merge_parser):
+        subparser.add_argument("--profile", dest="profiles", action="append", type=parse_profile,
+                               help="Template to apply as 'template path[:template type[:output folder]]', "
+                                    "may be repeated to produce several outputs in one pass")
+    for subparser in (pipeline_parser, transform_parser):
+        subparser.add_argument("--force", action="store_true",
+                               help="Regenerate all outputs, also the ones whose inputs did not change")
+    transform_parser.add_argument("--shard-index", type=int, default=0, help="The shard to transform on this node")
+    transform_parser.add_argument("--shard-count", type=int, default=1, help="The number of shards")
+    for subparser in (transform_parser, merge_parser):
+        subparser.add_argument("--run-id",
+                               help="Identifies the refresh, pass the same value to all shards and to the merge")
+
+    args = parser.parse_args(argv)
+    profiles = args.profiles or output_profiles
+    try:
+        check_profiles(profiles)
+        if args.command != "pipeline":
+            check_shard(getattr(args, "shard_index", 0), args.shard_count)
+    except ValueError as ex:
+        parser.error(str(ex))
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(message)s")
+    logger.setLevel(args.log_level.upper())
+
+    if args.command == "pipeline":
+        total = run_pipeline(args.workers, args.batch_size, profiles, args.force)
+        print(f"Transformed {total} records")
+    elif args.command == "transform":
+        total = run_transform(list_file_ids(parsed_datasets_directory), profiles, args.force,
+                              args.shard_index, args.shard_count, args.run_id)
+        print(f"Transformed {total} records")
+    elif args.command == "merge-shards":
+        index = merge_shards(args.shard_count, profiles=profiles, run_id=args.run_id)
+        print(f"Merged {args.shard_count} shards with {len(index)} records into {product_index_path}")
+
+
+if __name__ == "__main__":
+    main()
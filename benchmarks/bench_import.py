@@ -0,0 +1,67 @@
+"""
+Benchmark the cold import time of app.py, as paid by every uvicorn worker, --reload cycle and CLI run.
+
+Usage: python benchmarks/bench_import.py [--repeat 10] [--top 15]
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules which should only be imported on the code paths that use them
+LAZY_MODULES = ["requests", "tqdm", "markdown_plain_text", "argparse"]
+
+
+def run_python(code: str, *options: str) -> subprocess.CompletedProcess:
+    """Run code in a fresh interpreter from the repository root, so that .env and base_query.py are found."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    return subprocess.run([sys.executable, *options, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True,
+                          check=True)
+
+
+def import_time(module: str) -> float:
+    """Return the wall time in seconds of importing module in a fresh interpreter."""
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    return float(run_python(code).stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(module: str, top: int) -> list:
+    """Return the top slowest (cumulative) imports of module from python -X importtime."""
+    timings = []
+    for line in run_python(f"import {module}", "-X", "importtime").stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        timings.append({"module": name.strip(), "cumulative_ms": round(int(cumulative) / 1000, 2)})
+    return sorted(timings, key=lambda timing: timing["cumulative_ms"], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the import time of app.py.")
+    parser.add_argument("--module", default="app", help="Module to import")
+    parser.add_argument("--repeat", type=int, default=10, help="Fresh interpreters to time")
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to list")
+    args = parser.parse_args()
+
+    baseline = [import_time("fastapi") for _ in range(args.repeat)]
+    durations = [import_time(args.module) for _ in range(args.repeat)]
+    loaded = run_python(f"import sys, json, {args.module}; print(json.dumps(sorted(sys.modules)))").stdout
+    loaded = set(json.loads(loaded.strip().splitlines()[-1]))
+
+    print(json.dumps({
+        "module": args.module,
+        "repeat": args.repeat,
+        "median_ms": round(statistics.median(durations) * 1000, 2),
+        "min_ms": round(min(durations) * 1000, 2),
+        "fastapi_median_ms": round(statistics.median(baseline) * 1000, 2),
+        "eagerly_loaded": [module for module in LAZY_MODULES if module in loaded],
+        "slowest_imports": slowest_imports(args.module, args.top),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
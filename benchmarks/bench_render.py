@@ -0,0 +1,62 @@
+"""
+Benchmark the product renderers of create_response against dicttoxml.
+
+Usage: python benchmarks/bench_render.py [--products 200] [--repeat 5]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dicttoxml import dicttoxml  # noqa: E402
+
+import app  # noqa: E402
+from fixtures import make_product  # noqa: E402
+
+
+# values which dicttoxml renders differently depending on where they appear
+EDGE_CASES = [
+    {"flag": True, "empty": None, "nested": {"flag": False, "values": []}},
+    {"flags": [True, False, [True], (1, False), {"flag": True}], "items": [None, 0, 1.5, "a & <b>", {}]},
+    {"1 invalid key": [None], "valid.key-1": {"": "empty key"}},
+]
+
+
+def bench(name: str, render, products: list, repeat: int) -> dict:
+    best = None
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = sum(len(render(product)) for product in products)
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    result = {"renderer": name, "products": len(products), "bytes": size, "best_s": round(best, 4),
+              "per_product_ms": round(best / len(products) * 1000, 3)}
+    print(json.dumps(result))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the XML and text renderers against dicttoxml.")
+    parser.add_argument("--products", type=int, default=200, help="Number of products to render")
+    parser.add_argument("--size", type=int, default=50, help="Number of entries in the nested lists")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetitions, the best run is reported")
+    args = parser.parse_args()
+
+    products = [make_product(args.size) for _ in range(args.products)]
+    for product in [products[0], *EDGE_CASES]:
+        assert dicttoxml(product) == "".join(app.render_xml(product)).encode("utf-8"), product
+
+    results = [
+        bench("dicttoxml", dicttoxml, products, args.repeat),
+        bench("render_xml", lambda product: "".join(app.render_xml(product)).encode("utf-8"), products, args.repeat),
+        bench("render_text", lambda product: "".join(app.render_text(product)).encode("utf-8"), products, args.repeat),
+    ]
+    print(f"render_xml speedup over dicttoxml: {results[0]['best_s'] / results[1]['best_s']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
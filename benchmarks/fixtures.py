@@ -0,0 +1,26 @@
+"""
+Synthetic products shared by the benchmarks. Deliberately independent of app.py, so that load generators do not
+import the app.
+"""
+
+
+def make_product(size: int) -> dict:
+    """Create a synthetic nested SKG-IF like product with size identifiers, contributions and manifestations."""
+    return {
+        "@context": ["https://w3id.org/skg-if/context/1.0.1/skg-if.json", {"@base": "https://example.com/skg-if/api/"}],
+        "local_identifier": "https_58__47__47_archief.nl_47_id_47_dataset_47_toegang_47_2.16.131",
+        "identifiers": [{"scheme": "doi", "value": f"https://doi.org/10.1234/{i}"} for i in range(size)],
+        "entity_type": "product",
+        "product_type": "literature",
+        "titles": {"nl": ["Inventaris van het archief van het Ministerie & <Bureau> Bescherming, 1916-1939"]},
+        "abstracts": {"nl": ["Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 20]},
+        "contributions": [
+            {"by": f"person_{i}", "declared_affiliations": [f"org_{i}"], "roles": ["author"], "rank": i}
+            for i in range(size)
+        ],
+        "manifestations": [
+            {"type": {"class": "lit#:preprint", "labels": {"en": "preprint"}}, "dates": {"publication": ["2024"]},
+             "peer_review": {"status": True}, "access_rights": None, "version": 1.0}
+            for _ in range(size)
+        ],
+    }
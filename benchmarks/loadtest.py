@@ -0,0 +1,182 @@
+"""
+Load test the serving endpoints: /products and /products/{file_path} with JSON, XML and text responses.
+
+The app is started with uvicorn in a temporary directory seeded with a synthetic corpus, then every combination of
+uvicorn workers, corpus size, concurrency and media type is run for a fixed duration. Throughput, latency
+percentiles and error rates are reported as JSON.
+
+Usage: python benchmarks/loadtest.py --workers 1 4 --corpus 100 10000 --concurrency 1 16 64 --duration 10
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixtures import make_product  # noqa: E402
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# media types as passed in the accept query parameter, see get_accept_header in app.py
+MEDIA_TYPES = {
+    "application/json": None,
+    "application/xml": "accept=application/xml",
+    "text/plain": "accept=text/plain",
+}
+
+
+def seed_corpus(directory: str, size: int, product_size: int) -> list:
+    """
+    Write size synthetic products to the products folder, which /products and /products/{file_path} both serve.
+
+    return (list): The file names of the products
+    """
+    folder = os.path.join(directory, "products")
+    shutil.rmtree(folder, ignore_errors=True)
+    os.makedirs(folder)
+    file_names = []
+    for i in range(size):
+        product = make_product(product_size)
+        product["local_identifier"] = f"product_{i}"
+        file_name = f"product_{i}_processed.json"
+        with open(os.path.join(folder, file_name), "w") as file:
+            json.dump(product, file, indent=2)
+        file_names.append(file_name)
+    return file_names
+
+
+def start_server(directory: str, port: int, workers: int) -> subprocess.Popen:
+    """Start uvicorn in the corpus directory and wait until it answers."""
+    env = dict(os.environ, PRODUCTS_DIRECTORY=os.path.join(directory, "products"))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--app-dir", REPOSITORY, "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=directory, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/").status_code == 200:
+                return server
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("uvicorn did not start in 60 seconds")
+
+
+def stop_server(server: subprocess.Popen):
+    server.terminate()
+    try:
+        server.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+
+def percentile(values: list, fraction: float) -> float | None:
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+async def run_load(base_url: str, endpoint: str, file_names: list, media_type: str, concurrency: int,
+                   duration: float, accept_encoding: str) -> dict:
+    """
+    Send requests from concurrency closed-loop clients for duration seconds.
+    """
+    params = {"accept": MEDIA_TYPES[media_type]} if MEDIA_TYPES[media_type] else {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    latencies = []
+    errors = 0
+    received = 0
+
+    async def client_loop(client, deadline):
+        nonlocal errors, received
+        while time.perf_counter() < deadline:
+            url = "/products" if endpoint == "list" else f"/products/{random.choice(file_names)}"
+            start = time.perf_counter()
+            try:
+                response = await client.get(url, params=params)
+                received += len(response.content)
+                if response.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60,
+                                 headers={"Accept-Encoding": accept_encoding}) as client:
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(*[client_loop(client, deadline) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "error_rate": round(errors / len(latencies), 4) if latencies else None,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+        "bytes_received": received,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the serving endpoints of app.py.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1], help="uvicorn worker counts")
+    parser.add_argument("--corpus", type=int, nargs="+", default=[1000], help="Corpus sizes")
+    parser.add_argument("--product-size", type=int, default=20, help="Entries in the nested lists of a product")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="Concurrent clients")
+    parser.add_argument("--media-types", nargs="+", default=list(MEDIA_TYPES), choices=list(MEDIA_TYPES))
+    parser.add_argument("--endpoints", nargs="+", default=["file", "list"], choices=["file", "list"],
+                        help="file: /products/{file_path}, list: /products")
+    parser.add_argument("--accept-encoding", default="identity", help="Accept-Encoding header, e.g. gzip")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per run")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="loadtest_") as directory:
+        for corpus_size in args.corpus:
+            file_names = seed_corpus(directory, corpus_size, args.product_size)
+            for workers in args.workers:
+                server = start_server(directory, args.port, workers)
+                try:
+                    base_url = f"http://127.0.0.1:{args.port}"
+                    for endpoint in args.endpoints:
+                        for media_type in args.media_types:
+                            # warm up: /products loads the corpus on the first request of every worker
+                            asyncio.run(run_load(base_url, endpoint, file_names, media_type, workers, 1,
+                                                 args.accept_encoding))
+                            for concurrency in args.concurrency:
+                                result = {"workers": workers, "corpus": corpus_size, "endpoint": endpoint,
+                                          "media_type": media_type, "concurrency": concurrency,
+                                          "accept_encoding": args.accept_encoding}
+                                result.update(asyncio.run(run_load(base_url, endpoint, file_names, media_type,
+                                                                   concurrency, args.duration,
+                                                                   args.accept_encoding)))
+                                print(json.dumps(result), file=sys.stderr)
+                                results.append(result)
+                finally:
+                    stop_server(server)
+
+    report = json.dumps({"results": results}, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(report)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()